@@ -1,6 +1,9 @@
 # ===============================
 # Comprehensive Priority Score (CPS) Calculator
 # ===============================
+import logging
+
+logger = logging.getLogger(__name__)
 
 # -------------------------
 # Tuning knobs (adjustable)
@@ -32,20 +35,18 @@ CLASS_WEIGHTS = {
 # Part 1: Traffic Score
 # -------------------------
 def calculate_traffic_score(vehicle_counts):
-    traffic_score = 0
-    
-    print("\n---- Traffic Score per Class ----")
-    for cls, count in vehicle_counts.items():
-        try:
-            w_class = CLASS_WEIGHTS[cls]
-            class_score = w_class * count
-            print(f"  {cls.capitalize()}: {count} vehicles * weight {w_class} = {class_score:.2f}")
-            traffic_score += class_score
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("---- Traffic Score per Class ----")
+        for cls, count in vehicle_counts.items():
+            if cls in CLASS_WEIGHTS:
+                logger.debug("  %s: %s vehicles * weight %s = %.2f",
+                             cls.capitalize(), count, CLASS_WEIGHTS[cls], CLASS_WEIGHTS[cls] * count)
+            else:
+                logger.debug("  %s: no class weight, ignored", cls)
+
+    traffic_score = sum(CLASS_WEIGHTS.get(cls, 0) * count for cls, count in vehicle_counts.items())
+    logger.debug("Total Traffic Score: %.2f", traffic_score)
 
-        except:
-            print(cls)
-       
-    print(f"\nTotal Traffic Score: {traffic_score:.2f}\n")
     # Scale traffic score according to its contribution
     traffic_score_scaled = traffic_score * TRAFFIC_CONTRIB
     return traffic_score_scaled
@@ -54,43 +55,35 @@ def calculate_traffic_score(vehicle_counts):
 # Part 2: Safety Penalty
 # -------------------------
 def calculate_safety_penalty(hard_brakes,tailgating_events):
-    print("==== Safety Penalty Calculator ====\n")
-    
-    
     C_rate = hard_brakes * HARD_BRAKING_POINTS + tailgating_events * TAILGATING_POINTS
     safety_penalty_scaled = C_rate * SAFETY_CONTRIB
 
-    print(f"\nConflict Rate C_rate = {C_rate}")
-    print(f"Scaled Safety Penalty contribution (SAFETY_CONTRIB={SAFETY_CONTRIB}) = {safety_penalty_scaled:.2f}\n")
+    logger.debug("Conflict Rate C_rate = %s", C_rate)
+    logger.debug("Scaled Safety Penalty contribution (SAFETY_CONTRIB=%s) = %.2f", SAFETY_CONTRIB, safety_penalty_scaled)
     return safety_penalty_scaled
 
 # -------------------------
 # Part 3: Green Wave / Priority Bonus
 # -------------------------
 def calculate_green_wave_bonus(platoon_weight,distance_m,avg_speed_m_s):
-    print("==== Green Wave Priority Bonus Calculator ====\n")
-    
-    
     ETA = distance_m / avg_speed_m_s
     max_eta = ETA * MAX_ETA_SCALE
     P_imminent = platoon_weight * max(0, 1 - (ETA / max_eta))
     priority_bonus_scaled = P_imminent * GREEN_WAVE_CONTRIB
 
-    print(f"Tuning factor GREEN_WAVE_CONTRIB = {GREEN_WAVE_CONTRIB}")
-    print(f"ETA: {ETA:.2f} s, Max ETA for scaling: {max_eta:.2f} s")
-    print(f"P_imminent (scaled platoon weight) = {P_imminent:.2f}")
-    print(f"Scaled Priority Bonus contribution = {priority_bonus_scaled:.2f}\n")
-    
+    logger.debug("Tuning factor GREEN_WAVE_CONTRIB = %s", GREEN_WAVE_CONTRIB)
+    logger.debug("ETA: %.2f s, Max ETA for scaling: %.2f s", ETA, max_eta)
+    logger.debug("P_imminent (scaled platoon weight) = %.2f", P_imminent)
+    logger.debug("Scaled Priority Bonus contribution = %.2f", priority_bonus_scaled)
+
     return priority_bonus_scaled
 
 # -------------------------
 # Full CPS Calculation
 # -------------------------
 def calculate_cps(traffic_score,safety_penalty,priority_bonus):
-    print("===== Comprehensive Priority Score (CPS) Calculator =====\n")
-
-    
     CPS = traffic_score - safety_penalty + priority_bonus
+    logger.debug("CPS = %.2f - %.2f + %.2f = %.2f", traffic_score, safety_penalty, priority_bonus, CPS)
     return CPS   
  
 # -------------------------
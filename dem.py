@@ -1,9 +1,16 @@
+import asyncio
+import multiprocessing
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from fastapi import FastAPI
-from tracking1 import analyze_traffic_comprehensive as analyze1
-from tracking2 import analyze_traffic_comprehensive as analyze2
-from tracking3 import analyze_traffic_comprehensive as analyze3
-from tracking4 import analyze_traffic_comprehensive as analyze4
+from tracking1 import analyze_traffic_comprehensive as analyze1, VIDEO_PATH as video1
+from tracking2 import analyze_traffic_comprehensive as analyze2, VIDEO_PATH as video2
+from tracking3 import analyze_traffic_comprehensive as analyze3, VIDEO_PATH as video3
+from tracking4 import analyze_traffic_comprehensive as analyze4, VIDEO_PATH as video4
 from green_time import total_clear_time_and_rows
+from yolo_model import export_model
 from cps import calculate_traffic_score, calculate_safety_penalty, calculate_green_wave_bonus, calculate_cps
 
 app = FastAPI(
@@ -12,6 +19,110 @@ app = FastAPI(
     version="1.0"
 )
 
+logger = logging.getLogger(__name__)
+
+# Max number of video analyses running at once across all requests (caps GPU/VRAM contention)
+N_GPU_SLOTS = int(os.environ.get("N_GPU_SLOTS", 4))
+gpu_slots = asyncio.Semaphore(N_GPU_SLOTS)
+
+
+def new_analysis_pool():
+    # Spawned rather than forked: the parent has already touched CUDA, which is not fork-safe
+    return ProcessPoolExecutor(max_workers=N_GPU_SLOTS, mp_context=multiprocessing.get_context("spawn"))
+
+
+# Long-lived worker processes, so each loads the YOLO model once and reuses it across requests
+analysis_pool = new_analysis_pool()
+
+
+@app.on_event("startup")
+def prepare_model():
+    # Export the model here, once, before any worker process loads it
+    export_model()
+
+
+@app.on_event("shutdown")
+def shutdown_analysis_pool():
+    analysis_pool.shutdown()
+
+
+async def run_analysis(analyze_fn):
+    """
+    Run one signal's video analysis in the worker pool without blocking the event loop.
+    If a worker died and broke the pool, the pool is replaced and the analysis retried once.
+    """
+    global analysis_pool
+    async with gpu_slots:
+        loop = asyncio.get_running_loop()
+        pool = analysis_pool
+        try:
+            return await loop.run_in_executor(pool, analyze_fn)
+        except BrokenProcessPool:
+            # Only the first caller to see this pool break replaces it
+            if analysis_pool is pool:
+                logger.warning("Analysis worker pool broke, starting a new one")
+                analysis_pool = new_analysis_pool()
+                pool.shutdown(wait=False)
+            return await loop.run_in_executor(analysis_pool, analyze_fn)
+
+
+# Signal -> (analysis function, video file)
+SIGNALS = {
+    "1": (analyze1, video1),
+    "2": (analyze2, video2),
+    "3": (analyze3, video3),
+    "4": (analyze4, video4),
+}
+
+# Signal -> ((video mtime_ns, video size), summary)
+summary_cache = {}
+
+# Signal -> ((video mtime_ns, video size), asyncio.Task) for analyses still running
+pending_analyses = {}
+
+
+async def analyze_and_cache(signal, analyze_fn, cache_key):
+    """
+    Run a signal's analysis and cache its summary; clears the pending entry when done.
+    A run superseded by a newer one (the video changed meanwhile) doesn't touch the cache.
+    """
+    try:
+        summary = await run_analysis(analyze_fn)
+        if is_current_run(signal):
+            summary_cache[signal] = (cache_key, summary)
+        return summary
+    finally:
+        if is_current_run(signal):
+            del pending_analyses[signal]
+
+
+def is_current_run(signal):
+    return pending_analyses.get(signal, (None, None))[1] is asyncio.current_task()
+
+
+async def get_summary(signal, refresh=False):
+    """
+    Return the analysis summary for a signal, rerunning the video analysis only if
+    the video file changed since the cached run or refresh is requested.
+    Concurrent callers for the same signal and video share one in-flight analysis.
+    """
+    analyze_fn, video_path = SIGNALS[signal]
+    stat = os.stat(video_path)
+    cache_key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = summary_cache.get(signal)
+    if not refresh and cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    pending = pending_analyses.get(signal)
+    if pending is None or pending[0] != cache_key:
+        task = asyncio.create_task(analyze_and_cache(signal, analyze_fn, cache_key))
+        pending = pending_analyses[signal] = (cache_key, task)
+
+    # Shielded so a disconnecting client doesn't cancel the run other callers are awaiting
+    return await asyncio.shield(pending[1])
+
+
 # Root route
 @app.get("/")
 async def root():
@@ -69,9 +180,10 @@ async def analyze_signal1(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary1 = analyze1()
+    summary1 = await get_summary("1", refresh)
     metrics = calculate_signal_metrics(summary1, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -86,9 +198,10 @@ async def analyze_signal2(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary2 = analyze2()
+    summary2 = await get_summary("2", refresh)
     metrics = calculate_signal_metrics(summary2, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -103,9 +216,10 @@ async def analyze_signal3(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary3 = analyze3()
+    summary3 = await get_summary("3", refresh)
     metrics = calculate_signal_metrics(summary3, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -120,9 +234,10 @@ async def analyze_signal4(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary4 = analyze4()
+    summary4 = await get_summary("4", refresh)
     metrics = calculate_signal_metrics(summary4, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -138,18 +253,19 @@ async def analyze_intersection1(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
     """
     Run analysis for all 4 signals at Intersection 1.
     Each signal gets its own green time and CPS score.
+    Summaries are cached per video; pass refresh=true to force a rerun.
     """
 
-    # Step 1: Run tracking for each signal (analyze first)
-    summary1 = analyze1()
-    summary2 = analyze2()
-    summary3 = analyze3()
-    summary4 = analyze4()
+    # Step 1: Run tracking for each signal concurrently (analyze first)
+    summary1, summary2, summary3, summary4 = await asyncio.gather(
+        *[get_summary(signal, refresh) for signal in ("1", "2", "3", "4")]
+    )
 
     # Step 2: Calculate metrics for each signal individually (use the analyzed data)
     signal1_metrics = calculate_signal_metrics(summary1, lanes, platoon_weight, distance_m, avg_speed_m_s)
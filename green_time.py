@@ -1,17 +1,25 @@
+import functools
+import itertools
 import math
 
+# Clearance time per queued row: first four rows, then a constant for every further row
+BASE_TIMES = (3.8, 3.1, 2.7, 2.2)
+EXTRA_ROW_TIME = 2.1
+# Cumulative clearance time for 0..4 rows
+_CUMSUM = (0, *itertools.accumulate(BASE_TIMES))
+
+@functools.lru_cache(maxsize=4096)
 def total_clear_time_and_rows(queue_length: int, lanes: int) -> tuple[int, int]:
     """Return total clearance time (as integer) and total number of rows."""
     if queue_length <= 0 or lanes <= 0:
         return 0, 0
 
     rows = math.ceil(queue_length / lanes)
-    base_times = [3.8, 3.1, 2.7, 2.2]
 
-    if rows <= 4:
-        total_time = sum(base_times[:rows])
+    if rows <= len(BASE_TIMES):
+        total_time = _CUMSUM[rows]
     else:
-        total_time = sum(base_times) + (rows - 4) * 2.1
+        total_time = _CUMSUM[-1] + (rows - len(BASE_TIMES)) * EXTRA_ROW_TIME
 
     return int(round(total_time)), rows  # Convert total_time to integer
 
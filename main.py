@@ -1,8 +1,6 @@
+import asyncio
 from fastapi import FastAPI
-from tracking1 import analyze_traffic_comprehensive as analyze1
-from tracking2 import analyze_traffic_comprehensive as analyze2
-from tracking3 import analyze_traffic_comprehensive as analyze3
-from tracking4 import analyze_traffic_comprehensive as analyze4
+from dem import get_summary, prepare_model, shutdown_analysis_pool
 from green_time import total_clear_time_and_rows
 from cps import calculate_traffic_score, calculate_safety_penalty, calculate_green_wave_bonus, calculate_cps
 
@@ -12,6 +10,10 @@ app = FastAPI(
     version="1.0"
 )
 
+# Analyses run in dem's shared worker pool with its summary cache; export the model at startup
+app.add_event_handler("startup", prepare_model)
+app.add_event_handler("shutdown", shutdown_analysis_pool)
+
 # Root route
 @app.get("/")
 async def root():
@@ -69,9 +71,10 @@ async def analyze_signal1(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary1 = analyze1()
+    summary1 = await get_summary("1", refresh)
     metrics = calculate_signal_metrics(summary1, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -86,9 +89,10 @@ async def analyze_signal2(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary2 = analyze2()
+    summary2 = await get_summary("2", refresh)
     metrics = calculate_signal_metrics(summary2, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -103,9 +107,10 @@ async def analyze_signal3(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary3 = analyze3()
+    summary3 = await get_summary("3", refresh)
     metrics = calculate_signal_metrics(summary3, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -120,9 +125,10 @@ async def analyze_signal4(
     lanes: int = 2,
     platoon_weight: float = 1.0,
     distance_m: float = 100.0,
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
-    summary4 = analyze4()
+    summary4 = await get_summary("4", refresh)
     metrics = calculate_signal_metrics(summary4, lanes, platoon_weight, distance_m, avg_speed_m_s)
     return {
         "intersection": "1",
@@ -156,19 +162,20 @@ async def analyze_intersection1(
     signal4_lanes: int = 2,
     
     # Common parameter
-    avg_speed_m_s: float = 10.0
+    avg_speed_m_s: float = 10.0,
+    refresh: bool = False
 ):
     """
     Run analysis for all 4 signals at Intersection 1.
     Each signal gets its own green time and CPS score.
     Each signal can have different platoon_weight, distance, and lanes.
+    Summaries are cached per video; pass refresh=true to force a rerun.
     """
 
-    # Step 1: Run tracking for each signal (analyze first)
-    summary1 = analyze1()
-    summary2 = analyze2()
-    summary3 = analyze3()
-    summary4 = analyze4()
+    # Step 1: Run tracking for each signal concurrently (analyze first)
+    summary1, summary2, summary3, summary4 = await asyncio.gather(
+        *[get_summary(signal, refresh) for signal in ("1", "2", "3", "4")]
+    )
 
     # Step 2: Calculate metrics for each signal individually with their specific parameters
     signal1_metrics = calculate_signal_metrics(summary1, signal1_lanes, signal1_platoon_weight, signal1_distance_m, avg_speed_m_s)
@@ -1,9 +1,16 @@
 import cv2
-import math
-from ultralytics import YOLO
+import numpy as np
 from collections import defaultdict
+from tracking_kernels import grow_track_state, new_track_state, process_frame
+from yolo_model import MAX_BATCH, MODEL_LOCK, TRACK_ARGS, get_model
 
-def analyze_traffic_comprehensive(pixel_to_meter=0.05, tailgating_thresh=10, braking_thresh=8, platoon_dist=15, line_y_red=350, line_y_blue=400, save_video=False, output_video_path="output.mp4"):
+VIDEO_PATH = 'video3.mp4'
+
+# Tailgating pairs are packed into one int as (lo_id << PAIR_ID_SHIFT) | hi_id (track ids stay well below 2**20)
+PAIR_ID_SHIFT = 20
+PAIR_ID_MASK = (1 << PAIR_ID_SHIFT) - 1
+
+def analyze_traffic_comprehensive(pixel_to_meter=0.05, tailgating_thresh=10, braking_thresh=8, platoon_dist=15, line_y_red=350, line_y_blue=400, save_video=False, output_video_path="output.mp4", batch_size=MAX_BATCH, frame_stride=2, emit_frame_data=False):
     """
     Comprehensive traffic analysis combining counting, speed, violations, and distance analysis.
     
@@ -16,7 +23,7 @@ def analyze_traffic_comprehensive(pixel_to_meter=0.05, tailgating_thresh=10, bra
     tailgating_thresh : float
         Distance threshold in meters for tailgating detection
     braking_thresh : float
-        Speed drop threshold in km/h for hard braking detection
+        Speed drop threshold in km/h between consecutive analyzed frames for hard braking detection
     platoon_dist : float
         Distance threshold in meters for platoon formation
     line_y_red : int
@@ -27,216 +34,240 @@ def analyze_traffic_comprehensive(pixel_to_meter=0.05, tailgating_thresh=10, bra
         Whether to save annotated output video
     output_video_path : str
         Path for output video if save_video is True
+    batch_size : int
+        Number of frames sent to YOLO per call (1 = frame-by-frame tracking), at most MAX_BATCH
+    frame_stride : int
+        Analyze every Nth frame (1 = every frame); speeds use fps / frame_stride
+    emit_frame_data : bool
+        Whether to collect and return per-frame object data
     
     Returns:
     --------
     dict : Comprehensive summary with all metrics
-    list : Detailed frame-by-frame data
+    list : Detailed frame-by-frame data (only if emit_frame_data is True, as (summary, frame_data))
     """
     
-    # Load model
-    model = YOLO("yolo11n.pt")
-    class_list = model.names
+    # Shared model (loaded once per process)
+    model = get_model()
+    class_list = tuple(model.names[i] for i in range(len(model.names)))
     
     # Open video
-    cap = cv2.VideoCapture('video3.mp4')
+    cap = cv2.VideoCapture(VIDEO_PATH)
     fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
+    # Only every frame_stride-th frame is analyzed, so time steps are frame_stride frames long
+    effective_fps = fps / frame_stride
+    # Pixels moved between analyzed frames -> km/h
+    px_to_kmh = pixel_to_meter * effective_fps * 3.6
+    
+    # Tailgating threshold as a squared pixel distance, so pairs are compared without sqrt
+    tailgating_thresh_px_sq = (tailgating_thresh / pixel_to_meter) ** 2
+    
     # Video writer for saving output
     writer = None
     if save_video:
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        writer = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
+        writer = cv2.VideoWriter(output_video_path, fourcc, effective_fps, (width, height))
     
-    # Tracking dictionaries
-    prev_positions = {}
-    prev_speeds = {}
-    vehicles_seen = {}
+    # Per-track speed, braking and line-crossing state (arrays indexed by track id)
+    state = new_track_state()
+    # Class index of every track seen so far (-1 = unseen), indexed by track id
+    vehicles_seen = np.full(len(state.prev_cx), -1, dtype=np.int32)
     
     # Violation tracking
-    braking_flagged = set()
     tailgating_flagged = set()
     platoon_speeds = []
     
     # Directional counting
-    counted_ids_red_to_blue = set()
-    counted_ids_blue_to_red = set()
     count_red_to_blue = defaultdict(int)
     count_blue_to_red = defaultdict(int)
-    crossed_red_first = {}
-    crossed_blue_first = {}
     
-    # Distance analysis storage
-    distance_records = []
+    # Distance analysis counters
+    total_distance_records = 0
+    close_proximity_count = 0
     
     # Frame data storage
     frame_data = []
-    frame_no = 0
+    frame_no = 0        # analyzed frames
+    frames_read = 0     # all frames in the video, including skipped ones
     
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame_no += 1
-        
-        # Run YOLO tracking
-        results = model.track(frame, persist=True, tracker="bytetrack.yaml")
-        
-        frame_objects = []
-        vehicle_positions = []
+    # Reusable frame buffer for batched inference (the exported model takes at most MAX_BATCH frames)
+    batch_size = min(batch_size, MAX_BATCH)
+    frames_buf = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+    
+    # Hold the model for the whole video so the tracker state stays ours
+    with MODEL_LOCK:
+        # Always track with persist=True (Ultralytics binds persist when the tracker is first
+        # registered), and start this video from a clean tracker left over from the last one
+        predictor = model.predictor
+        if predictor is not None:
+            for tracker in getattr(predictor, "trackers", []):
+                tracker.reset()
+            if hasattr(predictor, "vid_path"):
+                predictor.vid_path = [None] * len(predictor.vid_path)
         
-        if results[0].boxes.data is not None:
-            boxes = results[0].boxes.xyxy.cpu()
-            track_ids = results[0].boxes.id.int().cpu().tolist()
-            class_indices = results[0].boxes.cls.int().cpu().tolist()
+        while cap.isOpened():
+            # Read up to batch_size frames into the buffer
+            frames = []
+            while len(frames) < batch_size:
+                if not cap.grab():
+                    break
+                frames_read += 1
+                # Analyze frames 1, 1 + frame_stride, 1 + 2 * frame_stride, ...; skip the rest
+                if (frames_read - 1) % frame_stride:
+                    continue
+                ret, frame = cap.retrieve(frames_buf[len(frames)])
+                if not ret:
+                    break
+                frames.append(frame)
+            if not frames:
+                break
             
-            # Draw counting lines (only if saving video)
-            if save_video:
-                cv2.line(frame, (70, line_y_red), (width-70, line_y_red), (0, 0, 255), 3)
-                cv2.putText(frame, "Red Line", (20, line_y_red - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                cv2.line(frame, (70, line_y_blue), (width-70, line_y_blue), (255, 0, 0), 3)
-                cv2.putText(frame, "Blue Line", (20, line_y_blue - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            # Run YOLO tracking on the whole batch (frames go through the tracker in order)
+            results = model.track(frames, persist=True, tracker="bytetrack.yaml", **TRACK_ARGS)
             
-            # Process each detected vehicle
-            for box, track_id, class_idx in zip(boxes, track_ids, class_indices):
-                x1, y1, x2, y2 = map(int, box)
-                cx = (x1 + x2) // 2
-                cy = (y1 + y2) // 2
-                class_name = class_list[class_idx]
-                
-                # Register vehicle
-                vehicles_seen[track_id] = class_name
-                
-                # --- Speed Calculation ---
-                if track_id in prev_positions:
-                    px, py = prev_positions[track_id]
-                    dist_px = math.sqrt((cx - px)**2 + (cy - py)**2)
-                    dist_m = dist_px * pixel_to_meter
-                    speed_mps = dist_m * fps
-                    speed_kmh = speed_mps * 3.6
-                else:
-                    speed_kmh = 0.0
-                
-                # --- Hard Braking Detection ---
-                braking_flag = False
-                if track_id in prev_speeds:
-                    speed_drop = prev_speeds[track_id] - speed_kmh
-                    if speed_drop > braking_thresh and track_id not in braking_flagged:
-                        braking_flagged.add(track_id)
-                        braking_flag = True
-                
-                prev_positions[track_id] = (cx, cy)
-                prev_speeds[track_id] = speed_kmh
-                
-                vehicle_positions.append((track_id, cx, cy, speed_kmh, class_name))
-                
-                # --- Line Crossing Logic ---
-                if line_y_red - 3 <= cy <= line_y_red + 3:
-                    if track_id not in crossed_red_first:
-                        crossed_red_first[track_id] = True
-                
-                if line_y_blue - 3 <= cy <= line_y_blue + 3:
-                    if track_id not in crossed_blue_first:
-                        crossed_blue_first[track_id] = True
-                
-                # Downward counting (red -> blue)
-                if track_id in crossed_red_first and track_id not in counted_ids_red_to_blue:
-                    if line_y_blue - 5 <= cy <= line_y_blue + 5:
-                        count_red_to_blue[class_name] += 1
-                        counted_ids_red_to_blue.add(track_id)
+            for frame, result in zip(frames, results):
+                frame_no += 1
                 
-                # Upward counting (blue -> red)
-                if track_id in crossed_blue_first and track_id not in counted_ids_blue_to_red:
-                    if line_y_red - 5 <= cy <= line_y_red + 5:
-                        count_blue_to_red[class_name] += 1
-                        counted_ids_blue_to_red.add(track_id)
+                frame_objects = []
                 
-                # Draw on frame (only if saving video)
-                if save_video:
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.circle(frame, (cx, cy), 4, (0, 0, 255), -1)
-                    label = f"ID:{track_id} {class_name} {speed_kmh:.1f}km/h"
-                    if braking_flag:
-                        label += " BRAKE!"
-                    cv2.putText(frame, label, (x1, y1 - 10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
-                
-                # Store frame object data
-                frame_objects.append({
-                    "id": track_id,
-                    "class": class_name,
-                    "bbox": [x1, y1, x2, y2],
-                    "center": (cx, cy),
-                    "speed": round(speed_kmh, 2),
-                    "braking": braking_flag
-                })
-            
-            # --- Tailgating & Distance Analysis ---
-            for i in range(len(vehicle_positions)):
-                for j in range(i + 1, len(vehicle_positions)):
-                    id1, x1, y1, v1, cname1 = vehicle_positions[i]
-                    id2, x2, y2, v2, cname2 = vehicle_positions[j]
-                    dist_px = math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
-                    dist_m = dist_px * pixel_to_meter
+                if result.boxes.id is not None:
+                    # Single device->host copy of [x1, y1, x2, y2, id, conf, cls] per detection
+                    # (float32 so ids stay exact even when inference runs in half precision)
+                    data = result.boxes.data.float().cpu().numpy()
                     
-                    # Store distance record
-                    distance_records.append({
-                        "frame": frame_no,
-                        "id1": id1,
-                        "id2": id2,
-                        "speed1": round(v1, 2),
-                        "speed2": round(v2, 2),
-                        "distance": round(dist_m, 2)
-                    })
+                    # Per-detection data as parallel arrays (class names only at summary/draw time)
+                    boxes_np = data[:, :4].astype(np.int32)
+                    ids_arr = data[:, 4].astype(np.int64)
+                    class_idx_arr = data[:, -1].astype(np.int32)
+                    cx_arr = (boxes_np[:, 0] + boxes_np[:, 2]) // 2
+                    cy_arr = (boxes_np[:, 1] + boxes_np[:, 3]) // 2
+                    n = len(ids_arr)
                     
-                    # Tailgating detection
-                    pair = tuple(sorted([id1, id2]))
-                    if dist_m < tailgating_thresh and pair not in tailgating_flagged:
-                        tailgating_flagged.add(pair)
-                        frame_objects.append({
-                            "tailgating_pair": pair,
-                            "distance": round(dist_m, 2)
-                        })
+                    # Draw counting lines (only if saving video)
+                    if save_video:
+                        cv2.line(frame, (70, line_y_red), (width-70, line_y_red), (0, 0, 255), 3)
+                        cv2.putText(frame, "Red Line", (20, line_y_red - 10),
+                                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                        cv2.line(frame, (70, line_y_blue), (width-70, line_y_blue), (255, 0, 0), 3)
+                        cv2.putText(frame, "Blue Line", (20, line_y_blue - 10),
+                                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
                     
-                    # Draw distance lines (only if saving video and close)
-                    if save_video and dist_m < tailgating_thresh:
-                        cv2.line(frame, (x1, y1), (x2, y2), (255, 255, 0), 2)
-                        cv2.putText(frame, f"{dist_m:.1f}m",
-                                   ((x1 + x2)//2, (y1 + y2)//2),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
-            
-            # --- Platoon Detection ---
-            if len(vehicle_positions) >= 3:
-                group_speeds = [v[3] for v in vehicle_positions]
-                platoon_speeds.append(sum(group_speeds) / len(group_speeds))
-            
-            # Display counts on frame (only if saving video)
-            if save_video:
-                y_offset = 30
-                for class_name, count in count_red_to_blue.items():
-                    cv2.putText(frame, f"{class_name} (Down): {count}", (10, y_offset),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    y_offset += 30
+                    # Speed, braking and line crossing for the whole frame
+                    if n:
+                        state = grow_track_state(state, ids_arr.max())
+                        if len(vehicles_seen) < len(state.prev_cx):
+                            vehicles_seen = np.concatenate([
+                                vehicles_seen,
+                                np.full(len(state.prev_cx) - len(vehicles_seen), -1, dtype=np.int32)
+                            ])
+                    speeds, braking_mask, down_mask, up_mask = process_frame(
+                        cx_arr, cy_arr, ids_arr, *state,
+                        float(px_to_kmh), int(line_y_red), int(line_y_blue), float(braking_thresh))
+                    
+                    # Register vehicles and directional counts
+                    vehicles_seen[ids_arr] = class_idx_arr
+                    for class_idx in class_idx_arr[down_mask]:
+                        count_red_to_blue[class_list[class_idx]] += 1
+                    for class_idx in class_idx_arr[up_mask]:
+                        count_blue_to_red[class_list[class_idx]] += 1
+                    
+                    # Per-vehicle drawing and frame data (only if requested)
+                    if save_video or emit_frame_data:
+                        for k in range(n):
+                            track_id, class_name = int(ids_arr[k]), class_list[class_idx_arr[k]]
+                            x1, y1, x2, y2 = boxes_np[k].tolist()
+                            cx, cy = int(cx_arr[k]), int(cy_arr[k])
+                            speed_kmh = float(speeds[k])
+                            braking_flag = bool(braking_mask[k])
+                            
+                            # Draw on frame (only if saving video)
+                            if save_video:
+                                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                                cv2.circle(frame, (cx, cy), 4, (0, 0, 255), -1)
+                                label = f"ID:{track_id} {class_name} {speed_kmh:.1f}km/h"
+                                if braking_flag:
+                                    label += " BRAKE!"
+                                cv2.putText(frame, label, (x1, y1 - 10),
+                                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+                            
+                            # Store frame object data
+                            if emit_frame_data:
+                                frame_objects.append({
+                                    "id": track_id,
+                                    "class": class_name,
+                                    "bbox": [x1, y1, x2, y2],
+                                    "center": (cx, cy),
+                                    "speed": round(speed_kmh, 2),
+                                    "braking": braking_flag
+                                })
+                    
+                    # --- Tailgating & Distance Analysis ---
+                    if n >= 2:
+                        # Squared pixel distances for all pairs in one shot, upper triangle only
+                        iu, ju = np.triu_indices(n, k=1)
+                        dx = (cx_arr[iu] - cx_arr[ju]).astype(np.int64)
+                        dy = (cy_arr[iu] - cy_arr[ju]).astype(np.int64)
+                        pair_d2 = dx * dx + dy * dy
+                        
+                        # Metric distance (sqrt) only for the close pairs that get reported
+                        close = pair_d2 < tailgating_thresh_px_sq
+                        ci, cj = iu[close], ju[close]
+                        close_dist = np.sqrt(pair_d2[close]) * pixel_to_meter
+                        total_distance_records += n * (n - 1) // 2
+                        close_proximity_count += len(close_dist)
+                        
+                        # Tailgating detection: flag close pairs not seen before
+                        pair_keys = (np.minimum(ids_arr[ci], ids_arr[cj]) << PAIR_ID_SHIFT) | np.maximum(ids_arr[ci], ids_arr[cj])
+                        for key, dist_m in zip(pair_keys.tolist(), close_dist.tolist()):
+                            if key not in tailgating_flagged:
+                                tailgating_flagged.add(key)
+                                if emit_frame_data:
+                                    frame_objects.append({
+                                        "tailgating_pair": (key >> PAIR_ID_SHIFT, key & PAIR_ID_MASK),
+                                        "distance": round(dist_m, 2)
+                                    })
+                        
+                        # Draw distance lines (only if saving video)
+                        if save_video:
+                            for i, j, dist_m in zip(ci, cj, close_dist):
+                                x1, y1 = int(cx_arr[i]), int(cy_arr[i])
+                                x2, y2 = int(cx_arr[j]), int(cy_arr[j])
+                                cv2.line(frame, (x1, y1), (x2, y2), (255, 255, 0), 2)
+                                cv2.putText(frame, f"{dist_m:.1f}m",
+                                           ((x1 + x2)//2, (y1 + y2)//2),
+                                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+                    
+                    # --- Platoon Detection ---
+                    if n >= 3:
+                        platoon_speeds.append(float(speeds.mean()))
+                    
+                    # Display counts on frame (only if saving video)
+                    if save_video:
+                        y_offset = 30
+                        for class_name, count in count_red_to_blue.items():
+                            cv2.putText(frame, f"{class_name} (Down): {count}", (10, y_offset),
+                                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                            y_offset += 30
+                        
+                        y_offset += 20
+                        for class_name, count in count_blue_to_red.items():
+                            cv2.putText(frame, f"{class_name} (Up): {count}", (10, y_offset),
+                                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                            y_offset += 30
                 
-                y_offset += 20
-                for class_name, count in count_blue_to_red.items():
-                    cv2.putText(frame, f"{class_name} (Up): {count}", (10, y_offset),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    y_offset += 30
-        
-        # Store frame data
-        frame_data.append({
-            "frame": frame_no,
-            "objects": frame_objects
-        })
-        
-        # Write frame to output video
-        if save_video and writer is not None:
-            writer.write(frame)
+                # Store frame data
+                if emit_frame_data:
+                    frame_data.append({
+                        "frame": (frame_no - 1) * frame_stride + 1,
+                        "objects": frame_objects
+                    })
+                
+                # Write frame to output video
+                if save_video and writer is not None:
+                    writer.write(frame)
     
     # Release resources
     cap.release()
@@ -244,19 +275,23 @@ def analyze_traffic_comprehensive(pixel_to_meter=0.05, tailgating_thresh=10, bra
         writer.release()
     
     # --- Build Summary ---
-    vehicle_counts = defaultdict(int)
-    for cls in vehicles_seen.values():
-        vehicle_counts[cls] += 1
-    vehicle_counts["total_unique_vehicles"] = len(vehicles_seen)
+    seen_classes = vehicles_seen[vehicles_seen >= 0]
+    counts_arr = np.bincount(seen_classes, minlength=len(class_list))
+    vehicle_counts = {class_list[i]: int(c) for i, c in enumerate(counts_arr) if c}
+    vehicle_counts["total_unique_vehicles"] = len(seen_classes)
+    
+    braking_ids = np.flatnonzero(state.braked).tolist()
     
     summary = {
         "video_info": {
-            "total_frames": frame_no,
+            "total_frames": frames_read,
+            "analyzed_frames": frame_no,
             "fps": fps,
-            "duration_seconds": round(frame_no / fps, 2)
+            "frame_stride": frame_stride,
+            "duration_seconds": round(frames_read / fps, 2)
         },
         "vehicle_counts": {
-            "unique_vehicles": dict(vehicle_counts),
+            "unique_vehicles": vehicle_counts,
             "directional_counts": {
                 "downward": dict(count_red_to_blue),
                 "upward": dict(count_blue_to_red),
@@ -265,19 +300,21 @@ def analyze_traffic_comprehensive(pixel_to_meter=0.05, tailgating_thresh=10, bra
             }
         },
         "violations": {
-            "hard_braking_count": len(braking_flagged),
-            "hard_braking_ids": list(braking_flagged),
+            "hard_braking_count": len(braking_ids),
+            "hard_braking_ids": braking_ids,
             "tailgating_count": len(tailgating_flagged),
-            "tailgating_pairs": [list(pair) for pair in tailgating_flagged]
+            "tailgating_pairs": [[key >> PAIR_ID_SHIFT, key & PAIR_ID_MASK] for key in tailgating_flagged]
         },
         "speed_analysis": {
             "avg_platoon_speed_kmh": round(sum(platoon_speeds)/len(platoon_speeds), 2) if platoon_speeds else 0,
             "platoon_frames": len(platoon_speeds)
         },
         "distance_analysis": {
-            "total_distance_records": len(distance_records),
-            "close_proximity_count": sum(1 for d in distance_records if d["distance"] < tailgating_thresh)
+            "total_distance_records": total_distance_records,
+            "close_proximity_count": close_proximity_count
         }
     }
     
-    return summary
\ No newline at end of file
+    if emit_frame_data:
+        return summary, frame_data
+    return summary
@@ -0,0 +1,128 @@
+import math
+import numpy as np
+from collections import namedtuple
+
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
+    # Pure-Python fallback: run the kernels as plain functions
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+# ByteTrack ids are small increasing integers, so per-track state lives in arrays indexed by id
+# (grown by doubling when a larger id shows up)
+INITIAL_TRACK_CAPACITY = 1024
+
+# Per-track state arrays, in the order process_frame expects them
+TrackState = namedtuple("TrackState", [
+    "prev_cx", "prev_cy", "prev_speed", "braked",
+    "crossed_red", "crossed_blue", "counted_down", "counted_up"
+])
+
+
+def new_track_state(size=INITIAL_TRACK_CAPACITY):
+    """Allocate empty per-track state (prev_cx == -1 means the track has not been seen yet)."""
+    return TrackState(
+        prev_cx=np.full(size, -1, dtype=np.int32),
+        prev_cy=np.full(size, -1, dtype=np.int32),
+        prev_speed=np.zeros(size, dtype=np.float32),
+        braked=np.zeros(size, dtype=np.bool_),
+        crossed_red=np.zeros(size, dtype=np.bool_),
+        crossed_blue=np.zeros(size, dtype=np.bool_),
+        counted_down=np.zeros(size, dtype=np.bool_),
+        counted_up=np.zeros(size, dtype=np.bool_),
+    )
+
+
+def grow_track_state(state, max_id):
+    """Return state with room for track id max_id, doubling the capacity as needed."""
+    size = len(state.prev_cx)
+    if max_id < size:
+        return state
+    while size <= max_id:
+        size *= 2
+    grown = new_track_state(size)
+    for old, new in zip(state, grown):
+        new[:len(old)] = old
+    return grown
+
+
+@njit(cache=True, fastmath=True)
+def process_frame(cx, cy, track_ids, prev_cx, prev_cy, prev_speed, braked,
+                  crossed_red, crossed_blue, counted_down, counted_up,
+                  px_to_kmh, line_red, line_blue, braking_thresh):
+    """
+    Speed, hard braking and line crossing for every detection of one frame.
+
+    A line counts as reached when the centre lands in its band or when the step from
+    the previous centre passes over it, so vehicles moving several pixels per analyzed
+    frame (e.g. with a frame stride) can't jump across a line uncounted.
+
+    Updates the per-track state arrays in place and returns, per detection:
+    speed in km/h, newly flagged hard braking, red->blue crossing, blue->red crossing.
+    px_to_kmh converts a per-frame pixel displacement to km/h (pixel_to_meter * fps * 3.6).
+    """
+    n = len(track_ids)
+    speeds = np.zeros(n, dtype=np.float32)
+    braking_mask = np.zeros(n, dtype=np.bool_)
+    down_mask = np.zeros(n, dtype=np.bool_)
+    up_mask = np.zeros(n, dtype=np.bool_)
+
+    for k in range(n):
+        t = track_ids[k]
+        x = cx[k]
+        y = cy[k]
+
+        seen = prev_cx[t] >= 0
+        py = prev_cy[t] if seen else y
+
+        # --- Speed & Hard Braking ---
+        speed_kmh = 0.0
+        if seen:
+            speed_kmh = math.hypot(x - prev_cx[t], y - prev_cy[t]) * px_to_kmh
+            if prev_speed[t] - speed_kmh > braking_thresh and not braked[t]:
+                braked[t] = True
+                braking_mask[k] = True
+
+        prev_cx[t] = x
+        prev_cy[t] = y
+        prev_speed[t] = speed_kmh
+        speeds[k] = speed_kmh
+
+        # --- Line Crossing ---
+        lo = min(py, y)
+        hi = max(py, y)
+        red_passed = lo <= line_red <= hi
+        blue_passed = lo <= line_blue <= hi
+
+        # Handle the lines in travel order (blue before red when moving up), so a step
+        # passing both lines counts only in its own direction
+        moving_up = y < py
+        for step in range(2):
+            if (step == 1) == moving_up:
+                if red_passed or line_red - 3 <= y <= line_red + 3:
+                    crossed_red[t] = True
+                # Upward (blue -> red)
+                if crossed_blue[t] and not counted_up[t] and (red_passed or line_red - 5 <= y <= line_red + 5):
+                    counted_up[t] = True
+                    up_mask[k] = True
+            else:
+                if blue_passed or line_blue - 3 <= y <= line_blue + 3:
+                    crossed_blue[t] = True
+                # Downward (red -> blue)
+                if crossed_red[t] and not counted_down[t] and (blue_passed or line_blue - 5 <= y <= line_blue + 5):
+                    counted_down[t] = True
+                    down_mask[k] = True
+
+    return speeds, braking_mask, down_mask, up_mask
+
+
+# Compile once at import so the first video frame doesn't pay for it
+if _NUMBA_AVAILABLE:
+    process_frame(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64),
+                  *new_track_state(1), 5.4, 0, 0, 0.0)
@@ -0,0 +1,67 @@
+import functools
+import logging
+import os
+import threading
+import torch
+from ultralytics import YOLO
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Model / inference settings
+# -------------------------
+WEIGHTS = "yolo11n.pt"
+IMGSZ = 640
+MAX_BATCH = 8  # largest frame batch the exported model accepts (dynamic shapes)
+
+if torch.cuda.is_available():
+    # TensorRT engine, INT8 (FP16 fallback for layers without INT8 kernels)
+    EXPORT_ARGS = {"format": "engine", "half": True, "int8": True, "imgsz": IMGSZ,
+                   "dynamic": True, "batch": MAX_BATCH}
+    EXPORTED_MODEL = "yolo11n.engine"
+    TRACK_ARGS = {"half": True, "imgsz": IMGSZ, "device": 0}
+else:
+    # OpenVINO INT8 for CPU-only deployments
+    EXPORT_ARGS = {"format": "openvino", "int8": True, "imgsz": IMGSZ,
+                   "dynamic": True, "batch": MAX_BATCH}
+    EXPORTED_MODEL = "yolo11n_int8_openvino_model"
+    TRACK_ARGS = {"imgsz": IMGSZ, "device": "cpu"}
+
+# The ByteTrack state lives on the shared model's predictor, so only one
+# video analysis per process may track with it at a time
+MODEL_LOCK = threading.Lock()
+
+
+def export_model():
+    """
+    Export WEIGHTS to EXPORTED_MODEL if it isn't there yet.
+    Run once from a single process (server startup or `python yolo_model.py`),
+    never from the analysis workers, so concurrent exports can't clobber each other.
+    """
+    if os.path.exists(EXPORTED_MODEL):
+        return
+    try:
+        YOLO(WEIGHTS).export(**EXPORT_ARGS)
+    except Exception:
+        logger.warning("Model export failed, analyses will use %s", WEIGHTS, exc_info=True)
+
+
+def load_model():
+    """
+    Load the exported quantized YOLO model, or the plain .pt weights if no export exists.
+    """
+    if os.path.exists(EXPORTED_MODEL):
+        return YOLO(EXPORTED_MODEL, task="detect")
+    logger.warning("%s not found, using %s (run export_model() first)", EXPORTED_MODEL, WEIGHTS)
+    return YOLO(WEIGHTS)
+
+
+@functools.lru_cache(maxsize=1)
+def get_model():
+    """Return the process-wide YOLO model, loading it on first call."""
+    return load_model()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    export_model()